@@ -26,37 +26,148 @@ dictionary objects with the format:
 #      You should have received a copy of the GNU Affero General Public License
 #      along with Principal Mapper.  If not, see <https://www.gnu.org/licenses/>.
 
+import concurrent.futures
 import datetime as dt
+import functools
+import io
 import json
-from typing import List, Optional, Tuple
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 import principalmapper
 from principalmapper.analysis.finding import Finding
 from principalmapper.analysis.report import Report
 from principalmapper.common import Graph, Node, Edge
 from principalmapper.querying import query_interface
-from principalmapper.querying.local_policy_simulation import resource_policy_authorization, ResourcePolicyEvalResult
+from principalmapper.querying.local_policy_simulation import resource_policy_authorization, ResourcePolicyEvalResult, \
+    _listify_dictionary, _listify_string, _matches_after_expansion
 from principalmapper.querying.presets.privesc import can_privesc
 from principalmapper.util import arns
 
 
+_UTC = dt.timezone.utc  # bound once: gen_report runs per account in org-wide batch scans
+
+
+# Static text of each finding's description preamble, rendered once at import instead of per report run.
+_PRIVESC_FINDING_PREAMBLE = (
+    'In AWS, IAM Principals such as IAM Users or IAM Roles have their permissions defined '
+    'using IAM Policies. These policies describe different actions, resources, and '
+    'conditions where the principal can make a given API call to a service.\n\n'
+    'Administrative principals can call any action with any resource, as in the '
+    'AdministratorAccess AWS-managed policy. However, some permissions may allow another '
+    'non-administrative principal to gain access to an administrative principal. '
+    'This represents a privilege escalation risk.\n\n'
+    'The following principals could escalate privileges:\n\n'
+)
+
+# pre-bound format method for the per-principal entries of the privesc finding
+_PRIVESC_FINDING_ITEM = '* {} can escalate privileges by accessing the administrative principal {}:\n{}\n\n'.format
+
+_MFA_ACTIONS_FINDING_PREAMBLE = (
+    'In AWS, IAM Users can be configured to use an MFA device. When an IAM User has MFA '
+    'enabled, they are required to provide the second factor of authentication when they '
+    'log in to the AWS Console. However, unless there is a specific IAM policy attached '
+    'to the user, they will not need to provide a second factor of authentication when '
+    'making API calls.\n\nThe following administrative IAM Users have at least one set of '
+    'access keys, and can call sensitive actions to alter permissions or add users '
+    'without using a second factor of authentication:\n\n'
+)
+
+_INSTANCE_PROFILE_FINDING_PREAMBLE = (
+    'In AWS, EC2 instances can be given an instance profile. These instance profiles '
+    'are associated with an IAM Role, and grants access to the permissions of the IAM '
+    'Role. Because EC2 instances are at a higher risk of exposure and compromise, both '
+    'to external attackers and authorized users in the AWS account, they should not have '
+    'access to administrative privileges. The following IAM Roles have administrative '
+    'permissions and are associated with an instance profile:\n\n'
+)
+
+_FUNCTION_FINDING_PREAMBLE = (
+    'In AWS, Lambda functions can be assigned an IAM Role to use during execution. These '
+    'IAM Roles give the function access to call the AWS API with the permissions of the '
+    'IAM Role, depending on the policies attached to it. If the Lambda function can be '
+    'compromised, and the attacker can alter the code it executes, the attacker could '
+    'make AWS API calls with the IAM Role\'s permissions. The following IAM Roles have '
+    'administrative privileges, and can be passed to Lambda functions:\n\n'
+)
+
+_STACK_FINDING_PREAMBLE = (
+    'In AWS, CloudFormation stacks can be given an IAM Role. When a stack has an IAM '
+    'Role, it can use that IAM Role to make AWS API calls to create the resources '
+    'defined in the template for that stack. If the IAM Role has administrator access '
+    'to the account, and an attacker is able to make the right CloudFormation API calls, '
+    'they would be able to use the IAM Role to escalate privileges and compromise the '
+    'account as a whole. The following IAM Roles can be used in CloudFormation and '
+    'have administrative privileges:\n\n'
+)
+
+_OS_LPE_FINDING_PREAMBLE = (
+    'In AWS EC2, instances can be assigned instance profiles. An instance profile is tied '
+    'to a single IAM Role. The instance profile can be used to access the AWS API with '
+    'the permissions of the IAM Role. If the IAM Role has permission to call certain SSM '
+    'actions such as `ssm:SendCommand` or `ssm:StartSession`, the instance profile '
+    'can be used to invoke commands on other instances or itself.'
+    '\n'
+    '\n'
+    'Because the SSM Agent runs with the highest permissions on their hosts '
+    '(root or SYSTEM), this can be a way for attackers to pivot and compromise other '
+    'instances, or escalate privileges on the local machine. The following IAM Roles '
+    'are attached to at least one instance profile and have permissions with the '
+    'aforementioned risk:'
+    '\n'
+    '\n'
+)
+
+_CIRCULAR_ACCESS_FINDING_PREAMBLE = (
+    'In AWS, an IAM Principal with a specific set of permissions can gain access '
+    'to another principal, such as when an IAM User has permission to call '
+    '`sts:AssumeRole` for an IAM Role. Principal Mapper tracks these connections as '
+    'Nodes (a.k.a. Vertices) and Edges in a Graph.'
+    '\n'
+    '\n'
+    'However, there may be instances where nodes can access each other in a circular '
+    'manner. This presents a risk in the account if an attacker gains access to one '
+    'of the principals in a cycle. An attacker can abuse that access to pivot between '
+    'each of the principals in a cycle. This can be used to evade detection or '
+    'persist access to an AWS account. The following cycles were identified:'
+    '\n'
+    '\n'
+)
+
+_ADMIN_NO_MFA_FINDING_PREAMBLE = (
+    'In AWS, an IAM User can be assigned a device for Multi-Factor Authentication (MFA). '
+    'When an IAM User is assigned an MFA device, they are required to provide an extra '
+    'factor of authentication when logging in to the AWS Console. It is also possible to '
+    'create IAM Policies that impose extra restrictions on the permissions of IAM Users '
+    'depending on whether or not they have authenticated with MFA when using the AWS API. '
+    'Any IAM User with administrative privileges should be configured to have an MFA '
+    'device. \n\n'
+    'The following IAM Users with administrative privileges do not have an MFA '
+    'device configured:'
+    '\n'
+    '\n'
+)
+
+
 def gen_findings_and_print(graph: Graph, formatting: str) -> None:
     """Generates findings of risk, prints them out."""
 
-    report = gen_report(graph)
-
     if formatting == 'text':
-        print_report(report)
+        # hand print_report a generator so findings stream out as each category is evaluated, rather than
+        # waiting for every finding generator to run before the first line of output
+        print_report(_make_report(graph, _iter_all_findings(graph)))
     else:  # format == 'json'
-        print(json.dumps(report.as_dictionary(), indent=4))
+        # serialize straight to stdout rather than materializing the whole document as a string first
+        json.dump(gen_report(graph).as_dictionary(), sys.stdout, indent=4)
+        sys.stdout.write('\n')
 
 
-def gen_report(graph: Graph) -> Report:
-    """Generates a Report object with findings and metadata about report-generation"""
-    findings = gen_all_findings(graph)
+def _make_report(graph: Graph, findings: Iterable[Finding]) -> Report:
+    """Wraps the given findings in a Report with metadata about report-generation."""
     return Report(
         graph.metadata['account_id'],
-        dt.datetime.now(dt.timezone.utc),
+        dt.datetime.now(_UTC),
         findings,
         'Findings identified using Principal Mapper ({}) from NCC Group: https://github.com/nccgroup/PMapper'.format(
             principalmapper.__version__
@@ -64,59 +175,150 @@ def gen_report(graph: Graph) -> Report:
     )
 
 
+def gen_report(graph: Graph) -> Report:
+    """Generates a Report object with findings and metadata about report-generation"""
+    return _make_report(graph, gen_all_findings(graph))
+
+
+class _NodeClassification(object):
+    """Holds the result of a single categorization pass over a Graph's nodes: the lists of nodes each finding
+    generator cares about. Classifying once up front means the generators don't each re-walk graph.nodes and
+    re-test the same user/role/admin/instance-profile predicates."""
+
+    def __init__(self, graph: Graph):
+        self.admins = []  # type: List[Node]
+        self.non_admins = []  # type: List[Node]
+        self.admin_users_no_mfa = []  # type: List[Node]
+        self.admin_users_with_keys = []  # type: List[Node]
+        self.admin_roles = []  # type: List[Node]
+        self.admin_roles_with_instance_profile = []  # type: List[Node]
+        self.roles_with_instance_profile = []  # type: List[Node]
+
+        # bind the hot lookups to locals: this loop is the only full node-list walk in report generation
+        get_resource = arns.get_resource
+        admins_append = self.admins.append
+        non_admins_append = self.non_admins.append
+        admin_users_no_mfa_append = self.admin_users_no_mfa.append
+        admin_users_with_keys_append = self.admin_users_with_keys.append
+        admin_roles_append = self.admin_roles.append
+        admin_roles_with_instance_profile_append = self.admin_roles_with_instance_profile.append
+        roles_with_instance_profile_append = self.roles_with_instance_profile.append
+
+        for node in graph.nodes:
+            resource = get_resource(node.arn)
+            is_user = resource.startswith('user/')
+            is_role = resource.startswith('role/')
+            has_instance_profile = node.instance_profile is not None and len(node.instance_profile) > 0
+
+            if node.is_admin:
+                admins_append(node)
+                if is_user and not node.has_mfa:
+                    admin_users_no_mfa_append(node)
+                if is_user and node.access_keys > 0:
+                    admin_users_with_keys_append(node)
+                if is_role:
+                    admin_roles_append(node)
+                    if has_instance_profile:
+                        admin_roles_with_instance_profile_append(node)
+            else:
+                non_admins_append(node)
+
+            if is_role and has_instance_profile:
+                roles_with_instance_profile_append(node)
+
+
+def _classify_nodes(graph: Graph) -> _NodeClassification:
+    """Performs the single categorization pass over a Graph's nodes for gen_all_findings."""
+    return _NodeClassification(graph)
+
+
+def _iter_all_findings(graph: Graph) -> Iterator[Finding]:
+    """Yields findings of risk as each finding generator produces them. A generator runs only once the findings
+    before it have been consumed, so a caller that stops early (e.g. a user interrupting text output) skips the
+    remaining generators entirely."""
+    classification = _classify_nodes(graph)
+    yield from gen_privesc_findings(graph, classification)
+    yield from gen_admin_users_without_mfa_finding(classification)
+    yield from gen_mfa_actions_findings(classification)
+    # TODO: yield from gen_mfa_evasion_finding(graph)  # policies that allow attackers to change MFA devices
+    if len(classification.admin_roles) > 0:  # without admin roles the overprivileged-role findings cannot fire
+        yield from gen_overprivileged_function_findings(classification)
+        yield from gen_overprivileged_instance_profile_findings(classification)
+        yield from gen_overprivileged_stack_findings(classification)
+    yield from gen_os_lpe_finding(classification)  # policies on EC2 instances that allow LPE with ssm-agent
+    yield from gen_circular_access_finding(graph, classification)  # nodes that can circularly access each other
+
+
 def gen_all_findings(graph: Graph) -> List[Finding]:
     """Generates findings of risk, returns a list of finding-dictionary objects."""
-    result = []
-    result.extend(gen_privesc_findings(graph))
-    result.extend(gen_admin_users_without_mfa_finding(graph))
-    result.extend(gen_mfa_actions_findings(graph))
-    # TODO: result.extend(gen_mfa_evasion_finding(graph))  # policies that allow attackers to change MFA devices
-    result.extend(gen_overprivileged_function_findings(graph))
-    result.extend(gen_overprivileged_instance_profile_findings(graph))
-    result.extend(gen_overprivileged_stack_findings(graph))
-    result.extend(gen_os_lpe_finding(graph))  # policies on EC2 instances that allow LPE with ssm-agent
-    result.extend(gen_circular_access_finding(graph))  # nodes that can circularly access each other
-    return result
+    return list(_iter_all_findings(graph))
+
+
+# Minimum number of source nodes before the privesc checks get spread across worker processes: for small graphs,
+# starting the pool (and pickling the Graph into each worker) costs more than the checks themselves.
+_PARALLEL_PRIVESC_THRESHOLD = 256
+
+_worker_graph = None  # type: Optional[Graph]
+_worker_nodes_by_arn = None  # type: Optional[dict]
+
+
+def _init_privesc_worker(graph: Graph) -> None:
+    """Process-pool initializer: stores the Graph in a module global so it is pickled into each worker once
+    instead of once per task."""
+    global _worker_graph, _worker_nodes_by_arn
+    _worker_graph = graph
+    _worker_nodes_by_arn = {node.arn: node for node in graph.nodes}
+
+
+def _can_privesc_worker(arn: str) -> Tuple[bool, Optional[List[Edge]]]:
+    """Runs can_privesc in a worker process against the Graph stored by _init_privesc_worker."""
+    return can_privesc(_worker_graph, _worker_nodes_by_arn[arn])
+
 
+def _map_can_privesc(graph: Graph, nodes: List[Node]) -> List[Tuple[bool, Optional[List[Edge]]]]:
+    """Evaluates can_privesc for each of the given nodes, in input order. Each check is independent and CPU-bound,
+    so on large graphs the work is distributed across a process pool; small graphs are checked serially."""
+    cpus = os.cpu_count() or 1
+    if len(nodes) < _PARALLEL_PRIVESC_THRESHOLD or cpus == 1:
+        return [can_privesc(graph, node) for node in nodes]
 
-def gen_privesc_findings(graph: Graph) -> List[Finding]:
+    chunk_size = max(1, len(nodes) // (4 * cpus))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=cpus, initializer=_init_privesc_worker,
+                                                initargs=(graph,)) as executor:
+        return list(executor.map(_can_privesc_worker, [node.arn for node in nodes], chunksize=chunk_size))
+
+
+def gen_privesc_findings(graph: Graph, classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to privilege escalation risks."""
     result = []
 
+    if len(classification.admins) == 0:
+        return result  # no admin principals means no privilege escalation targets
+
     node_path_list = []
 
-    for node in graph.nodes:
-        if node.is_admin:
-            continue  # skip current admins
-        privesc_res, edge_list = can_privesc(graph, node)
+    privesc_results = _map_can_privesc(graph, classification.non_admins)
+    for node, (privesc_res, edge_list) in zip(classification.non_admins, privesc_results):
         if privesc_res:
             node_path_list.append((node, edge_list))
 
     if len(node_path_list) > 0:
-        description_preamble = 'In AWS, IAM Principals such as IAM Users or IAM Roles have their permissions defined ' \
-                               'using IAM Policies. These policies describe different actions, resources, and ' \
-                               'conditions where the principal can make a given API call to a service.\n\n' \
-                               'Administrative principals can call any action with any resource, as in the ' \
-                               'AdministratorAccess AWS-managed policy. However, some permissions may allow another ' \
-                               'non-administrative principal to gain access to an administrative principal. ' \
-                               'This represents a privilege escalation risk.\n\n' \
-                               'The following principals could escalate privileges:\n\n'
-
-        description_body = ''
-        for node, edge_list in node_path_list:
-            end_of_list = edge_list[-1].destination
-            description_body += '* {} can escalate privileges by accessing the administrative principal {}:\n'.format(
-                node.searchable_name(), end_of_list.searchable_name())
-            for edge in edge_list:
-                description_body += '   * {}\n'.format(edge.describe_edge())
-            description_body += '\n'
+
+        description_body = ''.join(
+            _PRIVESC_FINDING_ITEM(
+                node.searchable_name(),
+                edge_list[-1].destination.searchable_name(),
+                '\n'.join('   * {}'.format(edge.describe_edge()) for edge in edge_list)
+            )
+            for node, edge_list in node_path_list
+        )
 
         result.append(Finding(
             'IAM {} Can Escalate Privileges'.format('Principals' if len(node_path_list) > 1 else 'Principal'),
             'High',
             'A lower-privilege IAM User or Role is able to gain administrative privileges. This could lead to the '
             'lower-privilege principal being used to compromise the account and its resources.',
-            description_preamble + description_body,
+            _PRIVESC_FINDING_PREAMBLE + description_body,
             'Review the IAM Policies that are applicable to the affected IAM User(s) or Role(s). Either reduce the '
             'permissions of the administrative principal(s), or reduce the permissions of the principal(s) that can '
             'access the administrative principals.'
@@ -125,32 +327,19 @@ def gen_privesc_findings(graph: Graph) -> List[Finding]:
     return result
 
 
-def gen_mfa_actions_findings(graph: Graph) -> List[Finding]:
+def gen_mfa_actions_findings(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to risk from IAM Users able to call sensitive actions without needing MFA."""
     result = []
     affected_users = []
-    for node in graph.nodes:
-        if ':user/' in node.arn and node.is_admin and node.access_keys > 0:
-            # Check if the given admin user with access keys can call sensitive actions without MFA
-            # TODO: Check for other actions in here?
-            actions = ['iam:CreateUser', 'iam:CreateRole', 'iam:CreateGroup', 'iam:PutUserPolicy', 'iam:PutRolePolicy',
-                       'iam:PutGroupPolicy', 'iam:AttachUserPolicy', 'iam:AttachRolePolicy', 'iam:AttachGroupPolicy',
-                       'sts:AssumeRole']
-            if _can_call_without_mfa(node, actions):
-                affected_users.append(node)
+    for node in classification.admin_users_with_keys:
+        # Check if the given admin user with access keys can call sensitive actions without MFA. The cheap
+        # statement scan rules out users whose policies never mention the actions before simulating.
+        if _policy_mentions_any(node, PRIVESC_ACTIONS) and _can_call_without_mfa(node, _SENSITIVE_MFA_ACTIONS):
+            affected_users.append(node)
 
     if len(affected_users) > 0:
-        description_preamble = 'In AWS, IAM Users can be configured to use an MFA device. When an IAM User has MFA ' \
-                               'enabled, they are required to provide the second factor of authentication when they ' \
-                               'log in to the AWS Console. However, unless there is a specific IAM policy attached ' \
-                               'to the user, they will not need to provide a second factor of authentication when ' \
-                               'making API calls.\n\nThe following administrative IAM Users have at least one set of ' \
-                               'access keys, and can call sensitive actions to alter permissions or add users ' \
-                               'without using a second factor of authentication:\n\n'
-
-        description_body = ''
-        for node in affected_users:
-            description_body += '* {}\n'.format(node.searchable_name())
+
+        description_body = ''.join('* {}\n'.format(node.searchable_name()) for node in affected_users)
 
         result.append(Finding(
             'Administrative IAM {} Can Call Sensitive Actions Without MFA'.format(
@@ -159,46 +348,81 @@ def gen_mfa_actions_findings(graph: Graph) -> List[Finding]:
             'Medium',
             'An adminstrative IAM User is able to call sensitive actions, such as creating more principals or '
             'modifying permissions, without using MFA.',
-            description_preamble + description_body,
+            _MFA_ACTIONS_FINDING_PREAMBLE + description_body,
             'Implement and attach an IAM Policy to the noted user(s) that rejects requests when MFA is not used.'
         ))
 
     return result
 
 
-def _can_call_without_mfa(node: Node, actions: List[str]) -> bool:
-    """Returns true if node can call sensitive action without MFA"""
-    for action in actions:
-        auth, needmfa = query_interface.local_check_authorization_handling_mfa(
-            node,
-            action,
-            '*',
-            {}
-        )
-        if auth and not needmfa:
-            return True
+# Actions that let a principal create other principals or alter permissions, i.e. escalate privileges.
+# gen_mfa_actions_findings simulates these, and _policy_mentions_any uses the set as a cheap client-side
+# prefilter before the simulation.
+# TODO: Check for other actions in here?
+PRIVESC_ACTIONS = frozenset({
+    'iam:AttachGroupPolicy', 'iam:AttachRolePolicy', 'iam:AttachUserPolicy',
+    'iam:CreateGroup', 'iam:CreateRole', 'iam:CreateUser',
+    'iam:PutGroupPolicy', 'iam:PutRolePolicy', 'iam:PutUserPolicy',
+    'sts:AssumeRole',
+})
+
+_SENSITIVE_MFA_ACTIONS = tuple(sorted(PRIVESC_ACTIONS))  # stable ordering for the memoized batch check
+
+
+def _policy_mentions_any(node: Node, actions: frozenset) -> bool:
+    """Client-side "has-statement" prefilter: returns True if any Allow statement in the node's attached or
+    group policies has an Action glob that could match one of the given actions. A principal whose policies
+    never mention an action cannot be authorized to call it, so callers can skip the full simulation when this
+    returns False. NotAction statements count as a potential match, since they cannot be ruled out without a
+    full evaluation. The glob matching reuses the compiled-pattern cache in the local policy simulation."""
+
+    policies = list(node.attached_policies)
+    for group in node.group_memberships:
+        policies.extend(group.attached_policies)
+
+    for policy in policies:
+        for statement in _listify_dictionary(policy.policy_doc['Statement']):
+            if statement['Effect'] != 'Allow':
+                continue
+            if 'Action' not in statement:  # NotAction: too broad to rule out without full evaluation
+                return True
+            for action_glob in _listify_string(statement['Action']):
+                for action in actions:
+                    if _matches_after_expansion(action, action_glob):
+                        return True
     return False
 
 
-def gen_overprivileged_instance_profile_findings(graph: Graph) -> List[Finding]:
+@functools.lru_cache(maxsize=8192)
+def _cached_check_authorization(node: Node, action: str, resource: str) -> bool:
+    """Memoized call to query_interface.local_check_authorization with an empty condition context. A report run
+    probes some (node, action, resource) tuples more than once, and library callers that generate reports in a
+    loop (multi-account scans) would otherwise redo every policy evaluation on each pass."""
+    return query_interface.local_check_authorization(node, action, resource, {})
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_check_authorization_handling_mfa_multi(node: Node, actions: Tuple[str, ...], resource: str) -> dict:
+    """Memoized batch call to query_interface.local_check_authorization_handling_mfa_multi with an empty
+    condition context. The finding generators repeatedly probe the same (node, action, resource) tuples, so
+    caching the simulation results avoids re-walking the same policies."""
+    return query_interface.local_check_authorization_handling_mfa_multi(node, list(actions), resource, {})
+
+
+def _can_call_without_mfa(node: Node, actions: Tuple[str, ...]) -> bool:
+    """Returns true if node can call sensitive action without MFA"""
+    results = _cached_check_authorization_handling_mfa_multi(node, actions, '*')
+    return any(auth and not needmfa for auth, needmfa in results.values())
+
+
+def gen_overprivileged_instance_profile_findings(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to risk from EC2 instances being loaded with overprivileged instance profiles."""
     result = []
-    affected_roles = []
-    for node in graph.nodes:
-        if ':role/' in node.arn and node.is_admin and len(node.instance_profile) > 0:
-            affected_roles.append(node)
+    affected_roles = classification.admin_roles_with_instance_profile
 
     if len(affected_roles) > 0:
-        description_preamble = 'In AWS, EC2 instances can be given an instance profile. These instance profiles ' \
-                               'are associated with an IAM Role, and grants access to the permissions of the IAM ' \
-                               'Role. Because EC2 instances are at a higher risk of exposure and compromise, both ' \
-                               'to external attackers and authorized users in the AWS account, they should not have ' \
-                               'access to administrative privileges. The following IAM Roles have administrative ' \
-                               'permissions and are associated with an instance profile:\n\n'
 
-        description_body = ''
-        for node in affected_roles:
-            description_body += '* {}\n'.format(node.searchable_name())
+        description_body = ''.join('* {}\n'.format(node.searchable_name()) for node in affected_roles)
 
         result.append(Finding(
             'Instance {} Administrator Privileges'.format(
@@ -207,35 +431,63 @@ def gen_overprivileged_instance_profile_findings(graph: Graph) -> List[Finding]:
             'High',
             'If an instance with the noted instance profile(s) is compromised, then the AWS account as a whole is at '
             'risk of compromise.',
-            description_preamble + description_body,
+            _INSTANCE_PROFILE_FINDING_PREAMBLE + description_body,
             'Reduce the scope of permissions attached to the noted instance profile(s).'
         ))
 
     return result
 
 
-def gen_overprivileged_function_findings(graph: Graph) -> List[Finding]:
+def _statically_trusted_services(node: Node) -> set:
+    """Statically parses a role's trust policy and returns the set of service principals named in its Allow
+    statements, caching the result on the node. This over-approximates the full resource-policy evaluation
+    (conditions are ignored, and wildcard or NotPrincipal statements add '*' to the set), so it is safe to use as
+    a prefilter: a service that does not show up in the returned set cannot assume the role, and only roles whose
+    trust policy mentions the service (or a wildcard) fall through to resource_policy_authorization."""
+
+    if 'trusted_services' not in node.cache:
+        services = set()
+        for statement in _listify_dictionary(node.trust_policy['Statement']):
+            if statement['Effect'] != 'Allow':
+                continue
+            if 'Principal' not in statement:  # NotPrincipal: cannot statically rule any service out
+                services.add('*')
+            elif statement['Principal'] == '*':
+                services.add('*')
+            elif 'Service' in statement['Principal']:
+                services.update(_listify_string(statement['Principal']['Service']))
+        node.cache['trusted_services'] = services
+    return node.cache['trusted_services']
+
+
+def _admin_roles_assumable_by_service(classification: _NodeClassification, service: str) -> List[Node]:
+    """Returns the admin roles that the given service principal (such as lambda.amazonaws.com) can assume,
+    using the static trust-policy prefilter before running the full resource-policy evaluation."""
+
+    # bind the per-iteration lookups to locals ahead of the loop
+    _rpa = query_interface.resource_policy_authorization
+    _service_match = ResourcePolicyEvalResult.SERVICE_MATCH
+    _get_account_id = arns.get_account_id
+
+    result = []
+    for node in classification.admin_roles:
+        trusted_services = _statically_trusted_services(node)
+        if service not in trusted_services and '*' not in trusted_services:
+            continue  # the trust policy names neither the service nor a wildcard principal, skip the simulation
+        if _rpa(service, _get_account_id(node.arn), node.trust_policy, 'sts:AssumeRole', node.arn, {}) \
+                == _service_match:
+            result.append(node)
+    return result
+
+
+def gen_overprivileged_function_findings(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to risk from Lambda functions being loaded with overprivileged roles"""
     result = []
-    affected_roles = []
-    for node in graph.nodes:
-        if ':role/' in node.arn and node.is_admin:
-            if query_interface.resource_policy_authorization('lambda.amazonaws.com', arns.get_account_id(node.arn),
-                                                             node.trust_policy, 'sts:AssumeRole', node.arn, {})\
-                    == query_interface.ResourcePolicyEvalResult.SERVICE_MATCH:
-                affected_roles.append(node)
+    affected_roles = _admin_roles_assumable_by_service(classification, 'lambda.amazonaws.com')
 
     if len(affected_roles) > 0:
-        description_preamble = 'In AWS, Lambda functions can be assigned an IAM Role to use during execution. These ' \
-                               'IAM Roles give the function access to call the AWS API with the permissions of the ' \
-                               'IAM Role, depending on the policies attached to it. If the Lambda function can be ' \
-                               'compromised, and the attacker can alter the code it executes, the attacker could ' \
-                               'make AWS API calls with the IAM Role\'s permissions. The following IAM Roles have ' \
-                               'administrative privileges, and can be passed to Lambda functions:\n\n'
 
-        description_body = ''
-        for node in affected_roles:
-            description_body += '* {}\n'.format(node.searchable_name())
+        description_body = ''.join('* {}\n'.format(node.searchable_name()) for node in affected_roles)
 
         result.append(Finding(
             'IAM Roles Available to Lambda Functions Have Administrative Privileges' if len(affected_roles) > 1 else
@@ -243,37 +495,21 @@ def gen_overprivileged_function_findings(graph: Graph) -> List[Finding]:
             'Medium',
             'If an attacker can inject code or commands into the function, or if a lower-privileged principal can '
             'alter the function, the AWS account as a whole could be compromised.',
-            description_preamble + description_body,
+            _FUNCTION_FINDING_PREAMBLE + description_body,
             'Reduce the scope of permissions attached to the noted IAM Role(s).'
         ))
 
     return result
 
 
-def gen_overprivileged_stack_findings(graph: Graph) -> List[Finding]:
+def gen_overprivileged_stack_findings(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to risk from CloudFormation stacks being loaded with overprivileged roles"""
     result = []
-    affected_roles = []
-    for node in graph.nodes:
-        if ':role/' in node.arn and node.is_admin:
-            if query_interface.resource_policy_authorization('cloudformation.amazonaws.com',
-                                                             arns.get_account_id(node.arn), node.trust_policy,
-                                                             'sts:AssumeRole', node.arn, {}) == \
-                    query_interface.ResourcePolicyEvalResult.SERVICE_MATCH:
-                affected_roles.append(node)
+    affected_roles = _admin_roles_assumable_by_service(classification, 'cloudformation.amazonaws.com')
 
     if len(affected_roles) > 0:
-        description_preamble = 'In AWS, CloudFormation stacks can be given an IAM Role. When a stack has an IAM ' \
-                               'Role, it can use that IAM Role to make AWS API calls to create the resources ' \
-                               'defined in the template for that stack. If the IAM Role has administrator access ' \
-                               'to the account, and an attacker is able to make the right CloudFormation API calls, ' \
-                               'they would be able to use the IAM Role to escalate privileges and compromise the ' \
-                               'account as a whole. The following IAM Roles can be used in CloudFormation and ' \
-                               'have administrative privileges:\n\n'
-
-        description_body = ''
-        for node in affected_roles:
-            description_body += '* {}\n'.format(node.searchable_name())
+
+        description_body = ''.join('* {}\n'.format(node.searchable_name()) for node in affected_roles)
 
         result.append(Finding(
             'IAM Roles Available to CloudFormation Stacks Have Administrative Privileges' if len(affected_roles) > 1
@@ -281,45 +517,28 @@ def gen_overprivileged_stack_findings(graph: Graph) -> List[Finding]:
             'Low',
             'If an attacker has the right permissions in the AWS Account, they can grant themselves adminstrative '
             'access to the account to compromise the account.',
-            description_preamble + description_body,
+            _STACK_FINDING_PREAMBLE + description_body,
             'Reduce the scope of permissions attached to the noted IAM Role(s).'
         ))
 
     return result
 
 
-def gen_os_lpe_finding(graph: Graph) -> List[Finding]:
+def gen_os_lpe_finding(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to risk of SSM permissions being misconfigured (local priv-esc on the host)"""
     result = []
     affected_roles = []
-    for node in graph.nodes:
-        if ':role/' in node.arn and node.instance_profile is not None and len(node.instance_profile) > 0:
-            # https://docs.aws.amazon.com/systems-manager/latest/userguide/systems-manager-setting-up-messageAPIs.html
-            if query_interface.local_check_authorization(node, 'ssmmessages:*', '*', {}):
-                if query_interface.local_check_authorization(node, 'ssm:SendCommand', '*', {}):
-                    affected_roles.append(node)
-                elif query_interface.local_check_authorization(node, 'ssm:StartSession', '*', {}):
-                    affected_roles.append(node)
+    for node in classification.roles_with_instance_profile:
+        # https://docs.aws.amazon.com/systems-manager/latest/userguide/systems-manager-setting-up-messageAPIs.html
+        if _cached_check_authorization(node, 'ssmmessages:*', '*'):
+            if _cached_check_authorization(node, 'ssm:SendCommand', '*'):
+                affected_roles.append(node)
+            elif _cached_check_authorization(node, 'ssm:StartSession', '*'):
+                affected_roles.append(node)
 
     if len(affected_roles) > 0:
-        description_preamble = 'In AWS EC2, instances can be assigned instance profiles. An instance profile is tied ' \
-                               'to a single IAM Role. The instance profile can be used to access the AWS API with ' \
-                               'the permissions of the IAM Role. If the IAM Role has permission to call certain SSM ' \
-                               'actions such as `ssm:SendCommand` or `ssm:StartSession`, the instance profile ' \
-                               'can be used to invoke commands on other instances or itself.' \
-                               '\n' \
-                               '\n' \
-                               'Because the SSM Agent runs with the highest permissions on their hosts ' \
-                               '(root or SYSTEM), this can be a way for attackers to pivot and compromise other ' \
-                               'instances, or escalate privileges on the local machine. The following IAM Roles ' \
-                               'are attached to at least one instance profile and have permissions with the ' \
-                               'aforementioned risk:' \
-                               '\n' \
-                               '\n'
-
-        description_body = ''
-        for node in affected_roles:
-            description_body += '* {}\n'.format(node.searchable_name())
+
+        description_body = ''.join('* {}\n'.format(node.searchable_name()) for node in affected_roles)
 
         result.append(Finding(
             'IAM Roles With Unsafe SSM Permissions' if len(affected_roles) > 1
@@ -327,109 +546,168 @@ def gen_os_lpe_finding(graph: Graph) -> List[Finding]:
             'Medium',
             'If an attacker gains access to an instance with the unsafe permissions, they could escalate privileges '
             'on its current host or compromise other hosts.',
-            description_preamble + description_body,
+            _OS_LPE_FINDING_PREAMBLE + description_body,
             'Reduce the scope of permissions attached to the noted IAM Role(s).'
         ))
 
     return result
 
 
-def _find_cycle(graph: Graph, origin: Node) -> Optional[List[Node]]:
-    """Internal method for finding a cycle with a given node. Does a Depth-first Search to attempt to identify one."""
-
-    current_root = origin
-    current_stack = [origin]
-    explored_nodes = []
+def _build_adjacency(graph: Graph) -> dict:
+    """Builds a node -> outbound-destinations mapping for the whole Graph in a single pass over graph.edges, so
+    that traversals do a dict lookup per node instead of re-filtering the full edge list. Mirrors
+    Node.get_outbound_edges: admin nodes are treated as having an edge to every other node."""
 
-    while len(current_stack) > 0:
-        outbound_nodes = [x.destination for x in current_root.get_outbound_edges(graph)]
-        if len(outbound_nodes) == 0:
-            current_root = current_stack.pop()
+    adjacency = {}
+    for node in graph.nodes:
+        if node.is_admin:
+            adjacency[node] = [other_node for other_node in graph.nodes if other_node is not node]
         else:
-            for node in outbound_nodes:
-                if node == origin:
-                    return current_stack
-            candidates = [x for x in outbound_nodes if x not in explored_nodes]
-            if len(candidates) == 0:
-                current_root = current_stack.pop()
-                continue
-            else:
-                explored_nodes.append(current_root)
-                current_root = candidates[0]
-                current_stack.append(current_root)
+            adjacency[node] = []
+    for edge in graph.edges:
+        if not edge.source.is_admin:
+            adjacency[edge.source].append(edge.destination)
+    return adjacency
+
+
+def _find_cycle(graph: Graph, origin: Node, adjacency: Optional[dict] = None) -> Optional[List[Node]]:
+    """Internal method for finding a cycle with a given node. Does a Depth-first Search to attempt to identify one.
+    Kept as a per-origin fallback: gen_circular_access_finding detects all cycles in one pass with _find_cycles.
+    Callers making repeated queries should build the adjacency mapping once with _build_adjacency and pass it in."""
+
+    if adjacency is None:
+        adjacency = _build_adjacency(graph)
+
+    # Standard color-marking DFS: gray nodes sit on the current search path, black nodes are fully explored and
+    # provably cannot lead back to the origin, everything else is unvisited. Marking dead ends black (instead of
+    # sharing one "explored" set with the live path) means each node is expanded at most once.
+    gray = {origin}
+    black = set()
+    path = [origin]
+    work_stack = [(origin, iter(adjacency[origin]))]
+
+    while len(work_stack) > 0:
+        current_node, neighbors = work_stack[-1]
+        advanced = False
+        for neighbor in neighbors:
+            if neighbor == origin:
+                return path
+            if neighbor not in gray and neighbor not in black:
+                gray.add(neighbor)
+                path.append(neighbor)
+                work_stack.append((neighbor, iter(adjacency[neighbor])))
+                advanced = True
+                break
+        if not advanced:
+            work_stack.pop()
+            gray.discard(current_node)
+            black.add(current_node)
+            path.pop()
 
     return None
 
 
-def gen_circular_access_finding(graph: Graph) -> List[Finding]:
-    """Generates findings related to the risk of a set of nodes that can circularly access each other.
-    Admins excluded."""
+def _find_cycles(graph: Graph, classification: _NodeClassification) -> List[List[Node]]:
+    """Internal method for finding all cycles of non-admin nodes in a Graph. Runs an iterative form of Tarjan's
+    strongly-connected-components algorithm, which identifies every cycle in a single O(V+E) pass instead of a
+    depth-first search per origin node. Each strongly-connected component with more than one member (or a member
+    with an edge to itself) is a set of nodes that can circularly access each other."""
+
+    non_admins = set(classification.non_admins)
+    adjacency = {node: [] for node in classification.non_admins}
+    for edge in graph.edges:
+        if edge.source in non_admins and edge.destination in non_admins:
+            adjacency[edge.source].append(edge.destination)
 
+    counter = 0
+    indices = {}
+    lowlinks = {}
+    scc_stack = []
+    on_stack = set()
     result = []
-    cycles = []
 
-    for node in graph.nodes:
-        if node.is_admin:
+    for root in classification.non_admins:
+        if root in indices:
             continue
 
-        cycle_result = _find_cycle(graph, node)
-        if cycle_result is not None:
-            cycles.append(cycle_result)
+        indices[root] = lowlinks[root] = counter
+        counter += 1
+        scc_stack.append(root)
+        on_stack.add(root)
+        work_stack = [(root, iter(adjacency[root]))]
+
+        while len(work_stack) > 0:
+            current_node, neighbors = work_stack[-1]
+            advanced = False
+            for neighbor in neighbors:
+                if neighbor not in indices:
+                    indices[neighbor] = lowlinks[neighbor] = counter
+                    counter += 1
+                    scc_stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work_stack.append((neighbor, iter(adjacency[neighbor])))
+                    advanced = True
+                    break
+                elif neighbor in on_stack:
+                    if indices[neighbor] < lowlinks[current_node]:
+                        lowlinks[current_node] = indices[neighbor]
+            if advanced:
+                continue
+
+            work_stack.pop()
+            if len(work_stack) > 0:
+                parent = work_stack[-1][0]
+                if lowlinks[current_node] < lowlinks[parent]:
+                    lowlinks[parent] = lowlinks[current_node]
+            if lowlinks[current_node] == indices[current_node]:
+                component = []
+                while True:
+                    member = scc_stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member is current_node:
+                        break
+                if len(component) > 1 or current_node in adjacency[current_node]:
+                    component.reverse()  # reverse the pop-ordering so the component reads in traversal order
+                    result.append(component)
+
+    return result
+
+
+def gen_circular_access_finding(graph: Graph, classification: _NodeClassification) -> List[Finding]:
+    """Generates findings related to the risk of a set of nodes that can circularly access each other.
+    Admins excluded."""
+
+    result = []
+    cycles = _find_cycles(graph, classification)
 
     if len(cycles) > 0:
-        description_preamble = 'In AWS, an IAM Principal with a specific set of permissions can gain access ' \
-                               'to another principal, such as when an IAM User has permission to call ' \
-                               '`sts:AssumeRole` for an IAM Role. Principal Mapper tracks these connections as ' \
-                               'Nodes (a.k.a. Vertices) and Edges in a Graph.' \
-                               '\n' \
-                               '\n' \
-                               'However, there may be instances where nodes can access each other in a circular ' \
-                               'manner. This presents a risk in the account if an attacker gains access to one ' \
-                               'of the principals in a cycle. An attacker can abuse that access to pivot between ' \
-                               'each of the principals in a cycle. This can be used to evade detection or ' \
-                               'persist access to an AWS account. The following cycles were identified:' \
-                               '\n' \
-                               '\n'
-
-        description_body = ''
-        for cycle in cycles:
-            description_body += '* {}\n'.format(' -> '.join([x.searchable_name() for x in cycle] + [cycle[0].searchable_name()]))
+
+        description_body = ''.join(
+            '* {}\n'.format(' -> '.join([x.searchable_name() for x in cycle] + [cycle[0].searchable_name()]))
+            for cycle in cycles
+        )
 
         result.append(Finding(
             'IAM Principals with Circular Access',
             'Low',
             'If an attacker gains access to one of the identified principals, they can potentially evade detections '
             'or persist access.',
-            description_preamble + description_body,
+            _CIRCULAR_ACCESS_FINDING_PREAMBLE + description_body,
             'Break the cycle of access by altering/removing permissions assigned to one of the noted principals.'
         ))
 
     return result
 
 
-def gen_admin_users_without_mfa_finding(graph: Graph) -> List[Finding]:
+def gen_admin_users_without_mfa_finding(classification: _NodeClassification) -> List[Finding]:
     """Generates findings related to IAM Users that have administrative privileges in an AWS account but no
     MFA device configured."""
 
     result = []
-    affected_nodes = []
-
-    for node in graph.nodes:
-        if node.searchable_name().startswith('user/') and node.is_admin and not node.has_mfa:
-            affected_nodes.append(node)
+    affected_nodes = classification.admin_users_no_mfa
 
     if len(affected_nodes) > 0:
-        description_preamble = 'In AWS, an IAM User can be assigned a device for Multi-Factor Authentication (MFA). ' \
-                               'When an IAM User is assigned an MFA device, they are required to provide an extra ' \
-                               'factor of authentication when logging in to the AWS Console. It is also possible to ' \
-                               'create IAM Policies that impose extra restrictions on the permissions of IAM Users ' \
-                               'depending on whether or not they have authenticated with MFA when using the AWS API. ' \
-                               'Any IAM User with administrative privileges should be configured to have an MFA ' \
-                               'device. \n\n' \
-                               'The following IAM Users with administrative privileges do not have an MFA ' \
-                               'device configured:' \
-                               '\n' \
-                               '\n'
 
         user_list = []
         for node in affected_nodes:
@@ -441,7 +719,7 @@ def gen_admin_users_without_mfa_finding(graph: Graph) -> List[Finding]:
             'Medium',
             'If an attacker gains access to any of the noted sensitive IAM Users, there is no secondary layer of '
             'protection in place to prevent the AWS from being compromised.',
-            description_preamble + description_body,
+            _ADMIN_NO_MFA_FINDING_PREAMBLE + description_body,
             'Assign an MFA device to each of the noted IAM Users.'
         ))
 
@@ -466,29 +744,37 @@ def gen_resources_with_potential_confused_deputies(graph: Graph) -> List[Finding
         }
     }
 
+    policies_by_service = {}
+    for policy in graph.policies:
+        policies_by_service.setdefault(arns.get_service(policy.arn), []).append(policy)
+
     affected_policies = []  # type: List[Tuple[str, str, str]]
-    for resource_type in resource_service_action_map.keys():
-        for policy in graph.policies:
-            if arns.get_service(policy.arn) == resource_type:
-                for service, action_list in resource_service_action_map[resource_type].items():
-                    available_actions = []
-                    for action in action_list:
-                        rpa_result = resource_policy_authorization(
-                            service,
-                            graph.metadata['account_id'],
-                            policy.policy_doc,
-                            action,
-                            policy.arn,
-                            {
-                                'aws:SourceAccount': '000000000000'
-                            }
-                        )
-                        if rpa_result.SERVICE_MATCH:
-                            available_actions.append(action)
-                    if len(available_actions) > 0:
-                        affected_policies.append(
-                            (policy.arn, service, ' | '.join(available_actions))
-                        )
+    for resource_type, service_action_map in resource_service_action_map.items():
+        for policy in policies_by_service.get(resource_type, []):
+            policy_text = json.dumps(policy.policy_doc)
+            for service, action_list in service_action_map.items():
+                # The resource policy can only match the service as a Principal if it names the service, uses a
+                # wildcard principal, or uses NotPrincipal; anything else cannot match, so skip the evaluation
+                if service not in policy_text and '"*"' not in policy_text and 'NotPrincipal' not in policy_text:
+                    continue
+                available_actions = []
+                for action in action_list:
+                    rpa_result = resource_policy_authorization(
+                        service,
+                        graph.metadata['account_id'],
+                        policy.policy_doc,
+                        action,
+                        policy.arn,
+                        {
+                            'aws:SourceAccount': '000000000000'
+                        }
+                    )
+                    if rpa_result == ResourcePolicyEvalResult.SERVICE_MATCH:
+                        available_actions.append(action)
+                if len(available_actions) > 0:
+                    affected_policies.append(
+                        (policy.arn, service, ' | '.join(available_actions))
+                    )
 
     if len(affected_policies) > 0:
         desc_list_str = '\n'.join(['* With service {}, the resource {} for the action(s): {}'.format(y, x, z) for x, y, z in affected_policies])
@@ -517,33 +803,41 @@ def gen_resources_with_potential_confused_deputies(graph: Graph) -> List[Finding
 
 
 def print_report(report: Report) -> None:
-    """Given a report, uses print() to print out their contents in a Markdown format."""
-
-    # Preamble
-    print('----------------------------------------------------------------')
-    print('# Principal Mapper Findings')
-    print()
-    print('Findings identified in AWS account {}'.format(report.account))
-    print()
-    print('Date and Time: {}'.format(report.date_and_time.isoformat()))
-    print()
-    print(report.source)
-    print()
+    """Given a report, writes its contents to stdout in a Markdown format. The report's findings may be any
+    iterable, including a generator: each finding is written (and flushed) as soon as it is produced, so the
+    first finding appears without waiting on the remaining finding generators."""
+
+    stdout = sys.stdout
+
+    # Preamble, assembled in a single buffer and written out once
+    preamble = io.StringIO()
+    preamble.write('----------------------------------------------------------------\n')
+    preamble.write('# Principal Mapper Findings\n')
+    preamble.write('\n')
+    preamble.write('Findings identified in AWS account {}\n'.format(report.account))
+    preamble.write('\n')
+    preamble.write('Date and Time: {}\n'.format(report.date_and_time.isoformat()))
+    preamble.write('\n')
+    preamble.write('{}\n'.format(report.source))
+    preamble.write('\n')
+    stdout.write(preamble.getvalue())
 
     # Findings
-    if len(report.findings) == 0:
-        print("None found.")
-        print()
-    else:
-        for finding in report.findings:
-            print(
-                "## {}\n\n### Severity\n\n{}\n\n### Impact\n\n{}\n\n### Description\n\n{}\n\n### Recommendation\n\n{}\n\n".format(
-                    finding.title, finding.severity, finding.impact, finding.description,finding.recommendation
-                )
+    finding_count = 0
+    for finding in report.findings:
+        finding_count += 1
+        stdout.write(
+            "## {}\n\n### Severity\n\n{}\n\n### Impact\n\n{}\n\n### Description\n\n{}\n\n### Recommendation\n\n{}\n\n\n".format(
+                finding.title, finding.severity, finding.impact, finding.description, finding.recommendation
             )
+        )
+        stdout.flush()
+    if finding_count == 0:
+        stdout.write('None found.\n')
+        stdout.write('\n')
 
     # Footer
 
-    print()
-    print('----------------------------------------------------------------')
+    stdout.write('\n')
+    stdout.write('----------------------------------------------------------------\n')
 
@@ -16,7 +16,7 @@
 #      along with Principal Mapper.  If not, see <https://www.gnu.org/licenses/>.
 
 import datetime as dt
-from typing import List
+from typing import Iterable
 
 from principalmapper.analysis.finding import Finding
 
@@ -24,9 +24,12 @@ from principalmapper.analysis.finding import Finding
 class Report:
     """FindingsReport holds information about findings, and where the findings were pulled from. It also provides a
     utility function to convert the contents of the report to a dictionary object.
+
+    The findings may be any iterable, including a generator that produces findings on demand; note that a
+    single-use iterator can only be consumed once (as_dictionary or a single pass over the findings).
     """
 
-    def __init__(self, account: str, date_and_time: dt.datetime, findings: List[Finding], source: str):
+    def __init__(self, account: str, date_and_time: dt.datetime, findings: Iterable[Finding], source: str):
         self.account = account
         self.date_and_time = date_and_time
         self.findings = findings
@@ -888,7 +888,7 @@ def _statement_matches_resource(statement: dict, resource: str, condition_keys:
         return True
 
 
-@functools.lru_cache(maxsize=2048, typed=True)
+@functools.lru_cache(maxsize=8192, typed=True)
 def _compose_pattern(string_to_transform) -> Pattern:
     """Helper function that transforms a string with potential wildcards (* or ?) into a regular expression.
     Uses the functools.lru_cache decorator to reduce re-compiling the same value multiple times."""
@@ -916,7 +916,9 @@ def _matches_after_expansion(string_to_check: str, string_to_check_against: str,
     # handles use of ${} var substitution, wildcards (*), and periods (.)
     copy_string = string_to_check_against
 
-    if condition_keys is not None:
+    # only pay for the substitution loop when the pattern actually contains a ${} variable: most action globs
+    # don't, and this function sits on the hottest path of the local policy evaluation
+    if condition_keys is not None and '${' in copy_string:
         for k, v in condition_keys.items():
             if isinstance(v, list):
                 v = str(v)  # TODO: how would a multi-valued context value be handled in resource fields?
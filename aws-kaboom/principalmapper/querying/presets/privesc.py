@@ -88,7 +88,7 @@ def can_privesc(graph: Graph, node: Node) -> (bool, List[Edge]):
     describes the path of edges the node would have to take to gain access to the admin node.
     """
     edge_lists = get_search_list(graph, node)
-    searched_nodes = []
+    searched_nodes = set()
     for edge_list in edge_lists:
         # check if the node at the end of the list has been looked at yet, skip if so
         end_of_list = edge_list[-1].destination
@@ -96,7 +96,7 @@ def can_privesc(graph: Graph, node: Node) -> (bool, List[Edge]):
             continue
 
         # add end of list to the searched nodes and do the privesc check
-        searched_nodes.append(end_of_list)
+        searched_nodes.add(end_of_list)
         if end_of_list.is_admin:
             return True, edge_list
     return False, None
@@ -221,6 +221,43 @@ def local_check_authorization_handling_mfa(principal: Node, action_to_check: str
     return False, False
 
 
+def local_check_authorization_handling_mfa_multi(principal: Node, actions_to_check: List[str], resource_to_check: str,
+                                                 condition_keys_to_check: _UODict) -> Dict[str, Tuple[bool, bool]]:
+    """Determine if a node is authorized to make a batch of API calls, handling MFA the same way as
+    local_check_authorization_handling_mfa. Returns a dictionary mapping each action to its
+    (authorized, MFA required) tuple.
+
+    The condition contexts (with and without the MFA keys) are prepared once and shared across all of the
+    actions, rather than being deep-copied and re-inferred for every action, so this is cheaper than calling
+    local_check_authorization_handling_mfa once per action."""
+
+    conditions_keys_copy = copy.deepcopy(condition_keys_to_check)
+    prepped_condition_keys = _prepare_condition_context(conditions_keys_copy)
+    prepped_condition_keys.update(_infer_condition_keys(principal, prepped_condition_keys))
+
+    mfa_condition_keys = None
+    if ':role/' not in principal.arn:  # TODO: aws:MultiFactorAuthPresent pass-through?
+        mfa_condition_keys = copy.deepcopy(prepped_condition_keys)
+        if 'aws:MultiFactorAuthAge' not in mfa_condition_keys:
+            mfa_condition_keys.update({'aws:MultiFactorAuthAge': '1'})
+        if 'aws:MultiFactorAuthPresent' not in mfa_condition_keys:
+            mfa_condition_keys.update({'aws:MultiFactorAuthPresent': 'true'})
+
+    results = {}
+    for action_to_check in actions_to_check:
+        if _local_check_authorization_full_prepped(principal, action_to_check, resource_to_check,
+                                                   prepped_condition_keys):
+            results[action_to_check] = (True, False)
+        elif mfa_condition_keys is not None and \
+                _local_check_authorization_full_prepped(principal, action_to_check, resource_to_check,
+                                                        mfa_condition_keys):
+            results[action_to_check] = (True, True)
+        else:
+            results[action_to_check] = (False, False)
+
+    return results
+
+
 def local_check_authorization(principal: Node, action_to_check: str, resource_to_check: str,
                               condition_keys_to_check: _UODict) -> bool:
     """Determine if a node is authorized to make an API call. It will perform a local evaluation of the attached
@@ -288,6 +325,21 @@ def local_check_authorization_full(principal: Node, action_to_check: str, resour
     prepped_condition_keys = _prepare_condition_context(conditions_keys_copy)
     prepped_condition_keys.update(_infer_condition_keys(principal, prepped_condition_keys))
 
+    return _local_check_authorization_full_prepped(principal, action_to_check, resource_to_check,
+                                                   prepped_condition_keys, resource_policy, resource_owner,
+                                                   service_control_policy_groups, session_policy)
+
+
+def _local_check_authorization_full_prepped(principal: Node, action_to_check: str, resource_to_check: str,
+                                            prepped_condition_keys: CaseInsensitiveDict,
+                                            resource_policy: Optional[dict] = None,
+                                            resource_owner: Optional[str] = None,
+                                            service_control_policy_groups: Optional[List[List[Policy]]] = None,
+                                            session_policy: Optional[dict] = None) -> bool:
+    """Internal method backing local_check_authorization_full: performs the full local policy evaluation with a
+    condition context that has already been prepped (CaseInsensitiveDict with inferred keys filled in). Callers
+    that evaluate several actions in a row can prepare the context once and invoke this per-action."""
+
     is_not_service_linked_role = not _check_if_service_linked_role(principal)
 
     logger.debug(
@@ -295,7 +347,7 @@ def local_check_authorization_full(principal: Node, action_to_check: str, resour
             principal.arn,
             action_to_check,
             resource_to_check,
-            conditions_keys_copy,
+            prepped_condition_keys,
             resource_policy,
             service_control_policy_groups,
             session_policy
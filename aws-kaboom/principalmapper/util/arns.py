@@ -24,6 +24,9 @@ arn:<partition>:<service>:<region>:<account id>:<resource/identifier>
 #      along with Principal Mapper.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import functools
+
+
 def get_partition(arn: str):
     """Returns the partition from a string ARN."""
     return arn.split(':')[1]
@@ -39,8 +42,10 @@ def get_region(arn: str):
     return arn.split(':')[3]
 
 
+@functools.lru_cache(maxsize=None)
 def get_account_id(arn: str):
-    """Returns the account ID from a string ARN."""
+    """Returns the account ID from a string ARN. ARNs are immutable and this gets called in hot loops (edge
+    identification, finding generation), so results are memoized."""
     return arn.split(':')[4]
 
 
@@ -22,7 +22,7 @@ from tests.build_test_graphs import *
 from tests.build_test_graphs import _build_user_with_policy
 from principalmapper.common.nodes import Node
 from principalmapper.common.policies import Policy
-from principalmapper.querying.query_interface import local_check_authorization, local_check_authorization_handling_mfa, has_matching_statement, _infer_condition_keys
+from principalmapper.querying.query_interface import local_check_authorization, local_check_authorization_handling_mfa, local_check_authorization_handling_mfa_multi, has_matching_statement, _infer_condition_keys
 
 logger = logging.getLogger(__name__)
 
@@ -857,3 +857,15 @@ class LocalQueryingTests(unittest.TestCase):
 
         self.assertFalse(mfa_result)
         self.assertTrue(auth_result)
+
+        # Test that the batched variant agrees with the one-at-a-time calls
+        multi_results = local_check_authorization_handling_mfa_multi(
+            test_node,
+            ['s3:ListAllMyBuckets', 'iam:EnableMFADevice', 'iam:CreateUser'],
+            '*',
+            {}
+        )
+        self.assertEqual(multi_results['s3:ListAllMyBuckets'], (True, True))
+        self.assertEqual(multi_results['iam:EnableMFADevice'],
+                         local_check_authorization_handling_mfa(test_node, 'iam:EnableMFADevice', '*', {}))
+        self.assertEqual(multi_results['iam:CreateUser'], (False, False))